@@ -26,37 +26,213 @@
 
 import sys
 import os
+import atexit
+import struct
+import threading
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from tensorrtserver.api import *
 import tensorrtserver.shared_memory as shm
-import tensorrtserver.cuda_shared_memory as cudashm
 import test_util as tu
 import shm_util as su
 from ctypes import *
 
-# unicode() doesn't exist on python3, for how we use it the
-# corresponding function is bytes()
-if sys.version_info.major == 3:
-    unicode = bytes
-
-_seen_request_ids = set()
+# Importing tensorrtserver.cuda_shared_memory loads the CUDA shared
+# memory client library, which drags in the CUDA runtime even for
+# CPU-only test shards. Defer the import to the first CUDA shared
+# memory use.
+_cudashm = None
+
+def _get_cudashm():
+    global _cudashm
+    if _cudashm is None:
+        import tensorrtserver.cuda_shared_memory as cudashm
+        _cudashm = cudashm
+    return _cudashm
+
+# Request ids seen so far, used to check that the server never reuses
+# one. An OrderedDict bounded to _MAX_SEEN_REQUEST_IDS keeps the
+# uniqueness check O(1) without growing without limit over a long test
+# session; the oldest ids are dropped once the cap is reached.
+_seen_request_ids = OrderedDict()
+_seen_request_ids_lock = threading.Lock()
+_MAX_SEEN_REQUEST_IDS = 1000000
+
+# The endpoint triple each test fans out over; attribute access reads
+# better (and is cheaper in CPython) than magic tuple indices.
+_Config = namedtuple('_Config', ['url', 'protocol', 'streaming'])
+
+# Use the PCG64-backed Generator instead of the legacy MT19937 global
+# RandomState; it produces the large batched draws below measurably
+# faster and holds no process-wide lock. One Generator per thread keeps
+# concurrent test threads from contending for shared RNG state. Set
+# INFER_UTIL_RNG_SEED for reproducible inputs.
+_rng_seed = os.environ.get('INFER_UTIL_RNG_SEED')
+_rng_tls = threading.local()
+
+def _rng():
+    rng = getattr(_rng_tls, 'rng', None)
+    if rng is None:
+        rng = np.random.default_rng(
+            None if _rng_seed is None else int(_rng_seed))
+        _rng_tls.rng = rng
+    return rng
+
+_RANGE_REPR_DTYPE = {
+    np.dtype(np.float64): np.int32,
+    np.dtype(np.float32): np.int16,
+    np.dtype(np.float16): np.int8,
+    np.dtype(np.object): np.int32,  # TYPE_STRING
+}
 
 def _range_repr_dtype(dtype):
-    if dtype == np.float64:
-        return np.int32
-    elif dtype == np.float32:
-        return np.int16
-    elif dtype == np.float16:
-        return np.int8
-    elif dtype == np.object:  # TYPE_STRING
-        return np.int32
-    return dtype
+    return _RANGE_REPR_DTYPE.get(np.dtype(dtype), dtype)
+
+# np.iinfo builds a fresh object on every call; with the heavily
+# parametrized test matrix the same handful of dtypes is queried
+# thousands of times, so memoize the (min, max) pairs.
+_dtype_bounds_cache = {}
+
+def _dtype_bounds(dtype):
+    key = np.dtype(dtype)
+    bounds = _dtype_bounds_cache.get(key, None)
+    if bounds is None:
+        info = np.iinfo(dtype)
+        bounds = (info.min, info.max)
+        _dtype_bounds_cache[key] = bounds
+    return bounds
 
 def _prepend_string_size(input_values):
-    input_list = []
+    # Serialize each tensor as <4-byte little-endian length><bytes> per
+    # element. Gathering the length/payload pairs and joining them once
+    # does a single large allocation instead of the quadratic
+    # bytes-concatenation done by serialize_string_tensor. The tensors
+    # are joined into one contiguous buffer, like the numeric shared
+    # memory path, so the copy into a region is one memmove rather than
+    # one small write per batch slot; the total byte count is unchanged.
+    pack_len = struct.Struct("<I").pack
+    pieces = []
     for input_value in input_values:
-        input_list.append(serialize_string_tensor(input_value))
-    return input_list
+        for s in input_value.reshape(-1):
+            if not isinstance(s, bytes):
+                s = str(s).encode('utf-8')
+            pieces.append(pack_len(len(s)))
+            pieces.append(s)
+    return [np.frombuffer(b''.join(pieces), dtype=np.uint8)]
+
+def _raw_equal(a, b):
+    # For equal shape and dtype the buffers can be compared directly,
+    # which is a single memcmp instead of NumPy's elementwise ufunc
+    # loop plus reduction. Object (string) tensors still need the
+    # elementwise compare.
+    if (a.dtype == np.object) or (b.dtype == np.object):
+        return np.array_equal(a, b)
+    if (a.shape != b.shape) or (a.dtype != b.dtype):
+        return False
+    if a.flags['C_CONTIGUOUS'] and b.flags['C_CONTIGUOUS']:
+        # memoryview compares the existing buffers in place; tobytes()
+        # would first copy each array into a fresh bytes object
+        return memoryview(a).cast('B') == memoryview(b).cast('B')
+    return a.tobytes() == b.tobytes()
+
+# Creating an InferContext sets up a TCP or gRPC connection, which is
+# expensive relative to the small requests these utilities send, so
+# reuse contexts across test calls. A context must never be shared
+# between threads: it records per-request state (last request id and
+# model name) and the HTTP implementation drives a libcurl multi
+# handle, which libcurl forbids using from more than one thread. The
+# cache is therefore keyed by thread as well, while the dict itself is
+# shared (under a lock) so every context can be closed at process
+# exit.
+_infer_ctx_cache = {}
+_infer_ctx_cache_lock = threading.Lock()
+
+def _get_infer_ctx(url, protocol, model_name, model_version, correlation_id,
+                   streaming):
+    key = (threading.get_ident(), url, protocol, model_name, model_version,
+           correlation_id, streaming)
+    with _infer_ctx_cache_lock:
+        ctx = _infer_ctx_cache.get(key, None)
+        if ctx is None:
+            ctx = InferContext(url, protocol, model_name, model_version,
+                               correlation_id=correlation_id,
+                               streaming=streaming, verbose=True)
+            _infer_ctx_cache[key] = ctx
+    return ctx
+
+def _close_cached_infer_ctxs():
+    with _infer_ctx_cache_lock:
+        for ctx in _infer_ctx_cache.values():
+            ctx.close()
+        _infer_ctx_cache.clear()
+
+atexit.register(_close_cached_infer_ctxs)
+
+# One long-lived executor runs the per-config fan-outs so the worker
+# threads -- and the per-thread InferContexts created on them -- are
+# reused across calls instead of being respawned (and re-connected)
+# for every call.
+_config_executor = ThreadPoolExecutor(max_workers=8)
+
+# infer_zero recreates shared memory regions with identical names and
+# sizes on every invocation. Keep the regions (and their server-side
+# registrations) in a module-level pool and only refresh the input
+# contents on reuse; the regions are destroyed when the test process
+# exits. The lock keeps concurrent test threads from evicting and
+# destroying a region another thread just took out of the pool.
+_either_shm_region_pool = {}
+_either_shm_region_pool_lock = threading.Lock()
+
+def _get_or_create_either_shm_region(shm_region_names, input_list,
+                                     input_byte_size, output_byte_size,
+                                     shared_memory_ctx,
+                                     use_system_shared_memory,
+                                     use_cuda_shared_memory, cuda_device_id=0):
+    if not (use_system_shared_memory or use_cuda_shared_memory):
+        return []
+    key = (tuple(shm_region_names), input_byte_size, output_byte_size,
+           use_system_shared_memory, use_cuda_shared_memory, cuda_device_id)
+    with _either_shm_region_pool_lock:
+        handles = _either_shm_region_pool.get(key, None)
+        if handles is None:
+            # a same-named region of a different size can't be reused so
+            # unregister and destroy it before creating the replacement
+            for old_key in list(_either_shm_region_pool.keys()):
+                if old_key[0] == key[0]:
+                    for handle in _either_shm_region_pool.pop(old_key):
+                        shared_memory_ctx.unregister(handle)
+                        su.destroy_either_shm_region(handle, old_key[3], old_key[4])
+            handles = su.create_register_set_either_shm_region(
+                            shm_region_names, input_list, input_byte_size,
+                            output_byte_size, shared_memory_ctx,
+                            use_system_shared_memory, use_cuda_shared_memory,
+                            cuda_device_id)
+            if len(handles) != 0:
+                _either_shm_region_pool[key] = handles
+        else:
+            # the region is already created and registered, just refresh
+            # the input contents
+            if use_cuda_shared_memory:
+                _get_cudashm().set_shared_memory_region(handles[0], input_list)
+            else:
+                shm.set_shared_memory_region(handles[0], input_list)
+    return handles
+
+def _destroy_either_shm_region_pool():
+    # unregister as well as destroy, otherwise the next client process
+    # against a still-running server fails its first registration with
+    # a duplicate-name error
+    shared_memory_ctx = su.get_shm_control_ctx("localhost:8000",
+                                               ProtocolType.HTTP)
+    with _either_shm_region_pool_lock:
+        for key, handles in _either_shm_region_pool.items():
+            for handle in handles:
+                shared_memory_ctx.unregister(handle)
+                su.destroy_either_shm_region(handle, key[3], key[4])
+        _either_shm_region_pool.clear()
+
+atexit.register(_destroy_either_shm_region_pool)
 
 # Perform inference using an "addsum" type verification backend.
 def infer_exact(tester, pf, tensor_shape, batch_size,
@@ -67,15 +243,15 @@ def infer_exact(tester, pf, tensor_shape, batch_size,
                 skip_request_id_check=False, use_streaming=True,
                 correlation_id=0, shm_region_names=None, precreated_shm_regions=None,
                 use_system_shared_memory=False, use_cuda_shared_memory=False,
-                priority=0, timeout_us=0):
+                cuda_device_id=0, priority=0, timeout_us=0):
     tester.assertTrue(use_http or use_grpc or use_streaming)
     configs = []
     if use_http:
-        configs.append(("localhost:8000", ProtocolType.HTTP, False))
+        configs.append(_Config("localhost:8000", ProtocolType.HTTP, False))
     if use_grpc:
-        configs.append(("localhost:8001", ProtocolType.GRPC, False))
+        configs.append(_Config("localhost:8001", ProtocolType.GRPC, False))
     if use_streaming:
-        configs.append(("localhost:8001", ProtocolType.GRPC, True))
+        configs.append(_Config("localhost:8001", ProtocolType.GRPC, True))
 
     # outputs are sum and difference of inputs so set max input
     # values so that they will not overflow the output. This
@@ -86,69 +262,72 @@ def infer_exact(tester, pf, tensor_shape, batch_size,
     rinput_dtype = _range_repr_dtype(input_dtype)
     routput0_dtype = _range_repr_dtype(output0_dtype if output0_raw else np.float32)
     routput1_dtype = _range_repr_dtype(output1_dtype if output1_raw else np.float32)
-    val_min = max(np.iinfo(rinput_dtype).min,
-                np.iinfo(routput0_dtype).min,
-                np.iinfo(routput1_dtype).min) / 2
-    val_max = min(np.iinfo(rinput_dtype).max,
-                np.iinfo(routput0_dtype).max,
-                np.iinfo(routput1_dtype).max) / 2
+    rinput_min, rinput_max = _dtype_bounds(rinput_dtype)
+    routput0_min, routput0_max = _dtype_bounds(routput0_dtype)
+    routput1_min, routput1_max = _dtype_bounds(routput1_dtype)
+    val_min = max(rinput_min, routput0_min, routput1_min) // 2
+    val_max = min(rinput_max, routput0_max, routput1_max) // 2
 
     num_classes = 3
 
-    input0_list = list()
-    input1_list = list()
-    expected0_list = list()
-    expected1_list = list()
-    expected0_val_list = list()
-    expected1_val_list = list()
-    for b in range(batch_size):
-        in0 = np.random.randint(low=val_min, high=val_max,
-                                size=tensor_shape, dtype=rinput_dtype)
-        in1 = np.random.randint(low=val_min, high=val_max,
-                                size=tensor_shape, dtype=rinput_dtype)
-        if input_dtype != np.object:
-            in0 = in0.astype(input_dtype)
-            in1 = in1.astype(input_dtype)
-
-        if not swap:
-            op0 = in0 + in1
-            op1 = in0 - in1
-        else:
-            op0 = in0 - in1
-            op1 = in0 + in1
-
-        expected0_val_list.append(op0)
-        expected1_val_list.append(op1)
-        if output0_dtype == np.object:
-            expected0_list.append(np.array([unicode(str(x), encoding='utf-8')
-                                            for x in (op0.flatten())], dtype=object).reshape(op0.shape))
-        else:
-            expected0_list.append(op0.astype(output0_dtype))
-        if output1_dtype == np.object:
-            expected1_list.append(np.array([unicode(str(x), encoding='utf-8')
-                                            for x in (op1.flatten())], dtype=object).reshape(op1.shape))
-        else:
-            expected1_list.append(op1.astype(output1_dtype))
+    # draw the whole batch with a single RNG call and compute the
+    # expected sum/diff vectorized over the batch dimension
+    in0_all = _rng().integers(low=val_min, high=val_max,
+                            size=(batch_size,) + tuple(tensor_shape),
+                            dtype=rinput_dtype)
+    in1_all = _rng().integers(low=val_min, high=val_max,
+                            size=(batch_size,) + tuple(tensor_shape),
+                            dtype=rinput_dtype)
+    if input_dtype != np.object:
+        # copy=False lets NumPy alias the array when the dtype already
+        # matches instead of forcing a full-batch copy
+        in0_all = in0_all.astype(input_dtype, copy=False)
+        in1_all = in1_all.astype(input_dtype, copy=False)
+
+    if not swap:
+        op0_all = in0_all + in1_all
+        op1_all = in0_all - in1_all
+    else:
+        op0_all = in0_all - in1_all
+        op1_all = in0_all + in1_all
 
-        if input_dtype == np.object:
-            in0n = np.array([str(x) for x in in0.reshape(in0.size)], dtype=object)
-            in0 = in0n.reshape(in0.shape)
-            in1n = np.array([str(x) for x in in1.reshape(in1.size)], dtype=object)
-            in1 = in1n.reshape(in1.shape)
+    expected0_val_list = list(op0_all)
+    expected1_val_list = list(op1_all)
 
-        input0_list.append(in0)
-        input1_list.append(in1)
+    if input_dtype != np.object:
+        # split the batched draw into per-slot views; list() over the
+        # first axis does not copy the rows
+        input0_list = list(in0_all)
+        input1_list = list(in1_all)
 
-    # prepend size of string to string input string data
+    # object (string) tensors are stringified over the whole batch in
+    # one np.char pass (NumPy's C-level formatter) and then split into
+    # per-slot views, the same way as the numeric path above
+    if output0_dtype == np.object:
+        expected0_list = list(
+            np.char.encode(np.char.mod('%d', op0_all), 'utf-8').astype(object))
+    if output1_dtype == np.object:
+        expected1_list = list(
+            np.char.encode(np.char.mod('%d', op1_all), 'utf-8').astype(object))
+    if input_dtype == np.object:
+        input0_list = list(np.char.mod('%d', in0_all).astype(object))
+        input1_list = list(np.char.mod('%d', in1_all).astype(object))
+
+    if output0_dtype != np.object:
+        expected0_list = list(op0_all.astype(output0_dtype, copy=False))
+    if output1_dtype != np.object:
+        expected1_list = list(op1_all.astype(output1_dtype, copy=False))
+
+    # prepend size of string to string input string data. For non-string
+    # inputs hand the whole batch to the shared memory helper as one
+    # contiguous array so the copy into the region is a single memmove
+    # instead of batch_size small writes.
     if input_dtype == np.object:
         input0_list_tmp = _prepend_string_size(input0_list)
         input1_list_tmp = _prepend_string_size(input1_list)
     else:
-        input0_list_tmp = input0_list
-        input1_list_tmp = input1_list
-
-    input0_byte_size = sum([i0.nbytes for i0 in input0_list])
-    input1_byte_size = sum([i1.nbytes for i1 in input1_list])
+        input0_list_tmp = [np.ascontiguousarray(in0_all)]
+        input1_list_tmp = [np.ascontiguousarray(in1_all)]
 
     if output0_dtype == np.object:
         expected0_list_tmp = _prepend_string_size(expected0_list)
@@ -163,112 +342,153 @@ def infer_exact(tester, pf, tensor_shape, batch_size,
     # Create and register system/cuda shared memory regions if needed
     shm_handles = su.create_register_set_shm_regions(input0_list_tmp, input1_list_tmp, expected0_list_tmp,
                                     expected1_list_tmp, outputs, shm_region_names, precreated_shm_regions,
-                                    use_system_shared_memory, use_cuda_shared_memory)
-
-    # Run inference and check results for each config
-    for config in configs:
-        model_name = tu.get_model_name(pf, input_dtype, output0_dtype, output1_dtype)
-
-        ctx = InferContext(config[0], config[1], model_name, model_version,
-                       correlation_id=correlation_id, streaming=config[2],
-                       verbose=True)
-
-        expected0_sort_idx = [ np.flip(np.argsort(x.flatten()), 0) for x in expected0_val_list ]
-        expected1_sort_idx = [ np.flip(np.argsort(x.flatten()), 0) for x in expected1_val_list ]
-
-        output_req = {}
-        OUTPUT0 = "OUTPUT0"
-        OUTPUT1 = "OUTPUT1"
-        INPUT0 = "INPUT0"
-        INPUT1 = "INPUT1"
-        if pf == "libtorch" or pf == "libtorch_nobatch":
-            OUTPUT0 = "OUTPUT__0"
-            OUTPUT1 = "OUTPUT__1"
-            INPUT0 = "INPUT__0"
-            INPUT1 = "INPUT__1"
-        i=0
-        if "OUTPUT0" in outputs:
-            if len(shm_handles) != 0:
-                output_req[OUTPUT0] = (InferContext.ResultFormat.RAW, shm_handles[2])
-            else:
-                if output0_raw:
-                    output_req[OUTPUT0] = InferContext.ResultFormat.RAW
-                else:
-                    output_req[OUTPUT0] = (InferContext.ResultFormat.CLASS, num_classes)
-            i+=1
-        if "OUTPUT1" in outputs:
-            if len(shm_handles) != 0:
-                output_req[OUTPUT1] = (InferContext.ResultFormat.RAW, shm_handles[2+i])
+                                    use_system_shared_memory, use_cuda_shared_memory, cuda_device_id)
+
+    # The sort indices depend only on the expected values so they can be
+    # computed once rather than once per config, and one batched argsort
+    # over the whole batch replaces batch_size small sorts. The [:, ::-1]
+    # view gives descending order without materializing a flipped copy.
+    expected0_sort_idx = np.argsort(
+        op0_all.reshape(batch_size, -1), axis=1)[:, ::-1]
+    expected1_sort_idx = np.argsort(
+        op1_all.reshape(batch_size, -1), axis=1)[:, ::-1]
+
+    # Like the sort indices, the flattened expected arrays only depend
+    # on the inputs so they are computed once per call rather than once
+    # per config; ravel returns a view when the array is already
+    # contiguous so this usually does no copying at all.
+    expected0_flat = [ e.ravel() for e in expected0_list ]
+    expected1_flat = [ e.ravel() for e in expected1_list ]
+
+    model_name = tu.get_model_name(pf, input_dtype, output0_dtype, output1_dtype)
+
+    # The IO names, output request dict and input dict are identical
+    # for every config, so build them once instead of once per config.
+    OUTPUT0 = "OUTPUT0"
+    OUTPUT1 = "OUTPUT1"
+    INPUT0 = "INPUT0"
+    INPUT1 = "INPUT1"
+    if pf == "libtorch" or pf == "libtorch_nobatch":
+        OUTPUT0 = "OUTPUT__0"
+        OUTPUT1 = "OUTPUT__1"
+        INPUT0 = "INPUT__0"
+        INPUT1 = "INPUT__1"
+    output_req = {}
+    i=0
+    if "OUTPUT0" in outputs:
+        if len(shm_handles) != 0:
+            output_req[OUTPUT0] = (InferContext.ResultFormat.RAW, shm_handles[2])
+        else:
+            if output0_raw:
+                output_req[OUTPUT0] = InferContext.ResultFormat.RAW
             else:
-                if output1_raw:
-                    output_req[OUTPUT1] = InferContext.ResultFormat.RAW
-                else:
-                    output_req[OUTPUT1] = (InferContext.ResultFormat.CLASS, num_classes)
-
+                output_req[OUTPUT0] = (InferContext.ResultFormat.CLASS, num_classes)
+        i+=1
+    if "OUTPUT1" in outputs:
         if len(shm_handles) != 0:
-            results = ctx.run(
-                    { INPUT0 : (shm_handles[0], tensor_shape),
-                    INPUT1 : (shm_handles[1], tensor_shape) },
-                    output_req, batch_size,
-                    priority=priority, timeout_us=timeout_us)
+            output_req[OUTPUT1] = (InferContext.ResultFormat.RAW, shm_handles[2+i])
         else:
-            results = ctx.run(
-                    { INPUT0 : input0_list, INPUT1 : input1_list },
-                    output_req, batch_size,
-                    priority=priority, timeout_us=timeout_us)
+            if output1_raw:
+                output_req[OUTPUT1] = InferContext.ResultFormat.RAW
+            else:
+                output_req[OUTPUT1] = (InferContext.ResultFormat.CLASS, num_classes)
+
+    if len(shm_handles) != 0:
+        input_req = { INPUT0 : (shm_handles[0], tensor_shape),
+                      INPUT1 : (shm_handles[1], tensor_shape) }
+    else:
+        input_req = { INPUT0 : input0_list, INPUT1 : input1_list }
+
+    # Run inference and check results for each config. The per-config
+    # runs only share read-only state so they can be issued concurrently;
+    # each blocks on a server round-trip and releases the GIL while
+    # waiting. When shared memory is in use the configs share the same
+    # output regions so they must run serially.
+    def _run_config(config):
+        ctx = _get_infer_ctx(config.url, config.protocol, model_name,
+                             model_version, correlation_id, config.streaming)
+
+        results = ctx.run(input_req, output_req, batch_size,
+                          priority=priority, timeout_us=timeout_us)
 
         if not skip_request_id_check:
-            global _seen_request_ids
             request_id = ctx.get_last_request_id()
-            tester.assertFalse(request_id in _seen_request_ids,
-                               "request_id: {}".format(request_id))
-            _seen_request_ids.add(request_id)
+            with _seen_request_ids_lock:
+                tester.assertFalse(request_id in _seen_request_ids,
+                                   "request_id: {}".format(request_id))
+                _seen_request_ids[request_id] = None
+                if len(_seen_request_ids) > _MAX_SEEN_REQUEST_IDS:
+                    _seen_request_ids.popitem(last=False)
 
         tester.assertEqual(ctx.get_last_request_model_name(), model_name)
         if model_version is not None:
             tester.assertEqual(ctx.get_last_request_model_version(), model_version)
 
         tester.assertEqual(len(results), len(outputs))
-        for (result_name, result_val) in iteritems(results):
-            for b in range(batch_size):
-                if ((result_name == OUTPUT0 and output0_raw) or
-                    (result_name == OUTPUT1 and output1_raw)):
-                    if result_name == OUTPUT0:
-                        tester.assertTrue(np.array_equal(result_val[b], expected0_list[b]),
-                                        "{}, {} expected: {}, got {}".format(
-                                            model_name, OUTPUT0, expected0_list[b], result_val[b]))
-                    elif result_name == OUTPUT1:
-                        tester.assertTrue(np.array_equal(result_val[b], expected1_list[b]),
+        for (result_name, result_val) in results.items():
+            if ((result_name == OUTPUT0 and output0_raw) or
+                (result_name == OUTPUT1 and output1_raw)):
+                expected_list = expected0_list if result_name == OUTPUT0 else expected1_list
+                tester.assertEqual(len(result_val), batch_size)
+                # compare the whole batch with one stacked compare and
+                # only fall back to the per-slot loop to localize the
+                # mismatch in the failure message
+                if not _raw_equal(np.stack(result_val), np.stack(expected_list)):
+                    for b in range(batch_size):
+                        tester.assertTrue(_raw_equal(result_val[b], expected_list[b]),
                                         "{}, {} expected: {}, got {}".format(
-                                            model_name, OUTPUT1, expected1_list[b], result_val[b]))
-                    else:
-                        tester.assertTrue(False, "unexpected raw result {}".format(result_name))
+                                            model_name, result_name, expected_list[b], result_val[b]))
+                continue
+            for b in range(batch_size):
+                # num_classes values must be returned and must
+                # match expected top values
+                class_list = result_val[b]
+                tester.assertEqual(len(class_list), num_classes)
+
+                # gather the (index, value, label) tuples into
+                # parallel arrays so the value checks are single
+                # vector compares instead of per-class assertEquals
+                class_idxs = np.array([c[0] for c in class_list],
+                                      dtype=np.int64)
+                class_vals = np.array([c[1] for c in class_list])
+                if result_name == OUTPUT0:
+                    # can't compare indices since could have
+                    # different indices with the same value/prob,
+                    # so compare that the value of each index
+                    # equals the expected value. Can only compare
+                    # labels when the indices are equal.
+                    sort_idx = expected0_sort_idx[b][:num_classes]
+                    tester.assertTrue(
+                        np.array_equal(class_vals, expected0_flat[b][class_idxs]),
+                        "{}, {} expected: {}, got {}".format(
+                            model_name, OUTPUT0, expected0_flat[b][class_idxs], class_vals))
+                    tester.assertTrue(
+                        np.array_equal(class_vals, expected0_flat[b][sort_idx]),
+                        "{}, {} expected: {}, got {}".format(
+                            model_name, OUTPUT0, expected0_flat[b][sort_idx], class_vals))
+                    for idx in np.flatnonzero(class_idxs == sort_idx):
+                        tester.assertEqual(class_list[idx][2], 'label{}'.format(sort_idx[idx]))
+                elif result_name == OUTPUT1:
+                    sort_idx = expected1_sort_idx[b][:num_classes]
+                    tester.assertTrue(
+                        np.array_equal(class_vals, expected1_flat[b][class_idxs]),
+                        "{}, {} expected: {}, got {}".format(
+                            model_name, OUTPUT1, expected1_flat[b][class_idxs], class_vals))
+                    tester.assertTrue(
+                        np.array_equal(class_vals, expected1_flat[b][sort_idx]),
+                        "{}, {} expected: {}, got {}".format(
+                            model_name, OUTPUT1, expected1_flat[b][sort_idx], class_vals))
                 else:
-                    # num_classes values must be returned and must
-                    # match expected top values
-                    class_list = result_val[b]
-                    tester.assertEqual(len(class_list), num_classes)
-
-                    expected0_flatten = expected0_list[b].flatten()
-                    expected1_flatten = expected1_list[b].flatten()
-
-                    for idx, ctuple in enumerate(class_list):
-                        if result_name == OUTPUT0:
-                            # can't compare indices since could have
-                            # different indices with the same
-                            # value/prob, so compare that the value of
-                            # each index equals the expected
-                            # value. Can only compare labels when the
-                            # indices are equal.
-                            tester.assertEqual(ctuple[1], expected0_flatten[ctuple[0]])
-                            tester.assertEqual(ctuple[1], expected0_flatten[expected0_sort_idx[b][idx]])
-                            if ctuple[0] == expected0_sort_idx[b][idx]:
-                                tester.assertEqual(ctuple[2], 'label{}'.format(expected0_sort_idx[b][idx]))
-                        elif result_name == OUTPUT1:
-                            tester.assertEqual(ctuple[1], expected1_flatten[ctuple[0]])
-                            tester.assertEqual(ctuple[1], expected1_flatten[expected1_sort_idx[b][idx]])
-                        else:
-                            tester.assertTrue(False, "unexpected class result {}".format(result_name))
+                    tester.assertTrue(False, "unexpected class result {}".format(result_name))
+        return results
+
+    if (len(shm_handles) == 0) and (len(configs) > 1):
+        futures = [_config_executor.submit(_run_config, config)
+                   for config in configs]
+        results = [future.result() for future in futures][-1]
+    else:
+        for config in configs:
+            results = _run_config(config)
 
     # Unregister system/cuda shared memory regions if they exist
     su.unregister_cleanup_shm_regions(shm_handles, precreated_shm_regions, outputs,
@@ -283,15 +503,15 @@ def infer_zero(tester, pf, batch_size, tensor_dtype, input_shapes, output_shapes
                model_version=None, use_http=True, use_grpc=True,
                use_streaming=True, shm_region_name_prefix=None,
                use_system_shared_memory=False, use_cuda_shared_memory=False,
-               priority=0, timeout_us=0):
+               cuda_device_id=0, priority=0, timeout_us=0):
     tester.assertTrue(use_http or use_grpc or use_streaming)
     configs = []
     if use_http:
-        configs.append(("localhost:8000", ProtocolType.HTTP, False))
+        configs.append(_Config("localhost:8000", ProtocolType.HTTP, False))
     if use_grpc:
-        configs.append(("localhost:8001", ProtocolType.GRPC, False))
+        configs.append(_Config("localhost:8001", ProtocolType.GRPC, False))
     if use_streaming:
-        configs.append(("localhost:8001", ProtocolType.GRPC, True))
+        configs.append(_Config("localhost:8001", ProtocolType.GRPC, True))
     tester.assertEqual(len(input_shapes), len(output_shapes))
     io_cnt = len(input_shapes)
 
@@ -303,7 +523,14 @@ def infer_zero(tester, pf, batch_size, tensor_dtype, input_shapes, output_shapes
     expected_dict = {}
     shm_ip_handles = list()
     shm_op_handles = list()
-    shared_memory_ctx = SharedMemoryControlContext("localhost:8000",  ProtocolType.HTTP, verbose=False)
+    # use the same protocol/endpoint for shared memory control as the
+    # inference configs so gRPC-only runs do not also need a second
+    # HTTP connection to port 8000
+    if use_grpc or use_streaming:
+        shared_memory_ctx = su.get_shm_control_ctx("localhost:8001", ProtocolType.GRPC)
+    else:
+        shared_memory_ctx = su.get_shm_control_ctx("localhost:8000", ProtocolType.HTTP)
+    tensor_dtype_itemsize = np.dtype(tensor_dtype).itemsize
 
     for io_num in range(io_cnt):
         if pf == "libtorch" or pf == "libtorch_nobatch":
@@ -313,41 +540,49 @@ def infer_zero(tester, pf, batch_size, tensor_dtype, input_shapes, output_shapes
             input_name = "INPUT{}".format(io_num)
             output_name = "OUTPUT{}".format(io_num)
 
-        input_list = list()
-        expected_list = list()
+        # preallocate the per-slot lists; appending would grow and
+        # reallocate them batch_size times
+        input_list = [None] * batch_size
+        expected_list = [None] * batch_size
+        rtensor_dtype = _range_repr_dtype(tensor_dtype)
+        if (rtensor_dtype != np.bool):
+            rtensor_min, rtensor_max = _dtype_bounds(rtensor_dtype)
+            in0_all = _rng().integers(low=rtensor_min, high=rtensor_max,
+                                    size=(batch_size,) + tuple(input_shapes[io_num]),
+                                    dtype=rtensor_dtype)
+        else:
+            in0_all = _rng().choice(a=[False, True],
+                                    size=(batch_size,) + tuple(input_shapes[io_num]))
         for b in range(batch_size):
-            rtensor_dtype = _range_repr_dtype(tensor_dtype)
-            if (rtensor_dtype != np.bool):
-                in0 = np.random.randint(low=np.iinfo(rtensor_dtype).min,
-                                        high=np.iinfo(rtensor_dtype).max,
-                                        size=input_shapes[io_num], dtype=rtensor_dtype)
-            else:
-                in0 = np.random.choice(a=[False, True], size=input_shapes[io_num])
+            in0 = in0_all[b]
             if tensor_dtype != np.object:
                 in0 = in0.astype(tensor_dtype)
-                expected0 = np.ndarray.copy(in0)
+                # nothing mutates in0 after this point so the expected
+                # tensor can alias it instead of copying
+                expected0 = in0
             else:
-                expected0 = np.array([unicode(str(x), encoding='utf-8')
-                                for x in in0.flatten()], dtype=object)
-                in0 = np.array([str(x) for x in in0.flatten()],
-                                dtype=object).reshape(in0.shape)
+                expected0 = np.char.encode(
+                    np.char.mod('%d', in0), 'utf-8').astype(object).flatten()
+                in0 = np.char.mod('%d', in0).astype(object)
 
             expected0 = expected0.reshape(output_shapes[io_num])
 
-            input_list.append(in0)
-            expected_list.append(expected0)
+            input_list[b] = in0
+            expected_list[b] = expected0
 
         expected_dict[output_name] = expected_list
 
         input_byte_size = tu.shape_element_count(input_shapes[io_num]) *\
-                            np.dtype(tensor_dtype).itemsize * batch_size
+                            tensor_dtype_itemsize * batch_size
         output_byte_size = tu.shape_element_count(output_shapes[io_num]) *\
-                            np.dtype(tensor_dtype).itemsize * batch_size
-        # create and register shared memory region for inputs and outputs
-        shm_io_handle = su.create_register_set_either_shm_region([shm_region_name_prefix[0]+str(io_num),
+                            tensor_dtype_itemsize * batch_size
+        # get pooled (or create and register new) shared memory regions
+        # for inputs and outputs
+        shm_io_handle = _get_or_create_either_shm_region([shm_region_name_prefix[0]+str(io_num),
                                                 shm_region_name_prefix[1]+str(io_num)], input_list,
                                                 input_byte_size, output_byte_size, shared_memory_ctx,
-                                                use_system_shared_memory, use_cuda_shared_memory)
+                                                use_system_shared_memory, use_cuda_shared_memory,
+                                                cuda_device_id)
         if len(shm_io_handle) != 0:
             shm_ip_handles.append(shm_io_handle[0])
             shm_op_handles.append(shm_io_handle[1])
@@ -357,13 +592,16 @@ def infer_zero(tester, pf, batch_size, tensor_dtype, input_shapes, output_shapes
             input_dict[input_name] = input_list
             output_dict[output_name] = InferContext.ResultFormat.RAW
 
-    # Run inference and check results for each config
-    for config in configs:
-        model_name = tu.get_zero_model_name(pf, io_cnt, tensor_dtype)
+    model_name = tu.get_zero_model_name(pf, io_cnt, tensor_dtype)
 
-        ctx = InferContext(config[0], config[1], model_name, model_version,
-                           correlation_id=0, streaming=config[2],
-                           verbose=True)
+    # Run inference and check results for each config. As in
+    # infer_exact, the per-config runs only share read-only state so
+    # they can be issued concurrently while each blocks on its server
+    # round-trip; with shared memory the configs write the same output
+    # regions and must run serially.
+    def _run_config(config):
+        ctx = _get_infer_ctx(config.url, config.protocol, model_name,
+                             model_version, 0, config.streaming)
         results = ctx.run(input_dict, output_dict, batch_size,
                           priority=priority, timeout_us=timeout_us)
 
@@ -372,22 +610,33 @@ def infer_zero(tester, pf, batch_size, tensor_dtype, input_shapes, output_shapes
             tester.assertEqual(ctx.get_last_request_model_version(), model_version)
 
         tester.assertEqual(len(results), io_cnt)
-        for (result_name, result_val) in iteritems(results):
+        for (result_name, result_val) in results.items():
             tester.assertTrue(result_name in output_dict)
             tester.assertTrue(result_name in expected_dict)
+            expected_list = expected_dict[result_name]
+            tester.assertEqual(len(result_val), batch_size)
             for b in range(batch_size):
-                expected = expected_dict[result_name][b]
-                tester.assertEqual(result_val[b].shape, expected.shape)
-                tester.assertTrue(np.array_equal(result_val[b], expected),
-                                  "{}, {}, slot {}, expected: {}, got {}".format(
-                                      model_name, result_name, b, expected, result_val[b]))
+                tester.assertEqual(result_val[b].shape, expected_list[b].shape)
+            # compare the whole batch with one stacked compare and only
+            # fall back to the per-slot loop to localize the mismatch
+            # in the failure message
+            if not _raw_equal(np.stack(result_val), np.stack(expected_list)):
+                for b in range(batch_size):
+                    tester.assertTrue(_raw_equal(result_val[b], expected_list[b]),
+                                      "{}, {}, slot {}, expected: {}, got {}".format(
+                                          model_name, result_name, b, expected_list[b], result_val[b]))
+        return results
+
+    if (len(shm_ip_handles) == 0) and (len(configs) > 1):
+        futures = [_config_executor.submit(_run_config, config)
+                   for config in configs]
+        results = [future.result() for future in futures][-1]
+    else:
+        for config in configs:
+            results = _run_config(config)
 
-    if len(shm_ip_handles) != 0:
-        for io_num in range(io_cnt):
-            shared_memory_ctx.unregister(shm_ip_handles[io_num])
-            shared_memory_ctx.unregister(shm_op_handles[io_num])
-            su.destroy_either_shm_region(shm_ip_handles[io_num], use_system_shared_memory, use_cuda_shared_memory)
-            su.destroy_either_shm_region(shm_op_handles[io_num], use_system_shared_memory, use_cuda_shared_memory)
+    # pooled shared memory regions stay registered for reuse by the
+    # next invocation and are destroyed at process exit
 
     return results
 
@@ -397,15 +646,16 @@ def infer_zero(tester, pf, batch_size, tensor_dtype, input_shapes, output_shapes
 def infer_shape_tensor(tester, pf, batch_size, tensor_dtype, input_shape_values, dummy_input_shapes,
                model_version=None, use_http=True, use_grpc=True,
                use_streaming=True, shm_suffix="", use_system_shared_memory=False,
-               use_cuda_shared_memory=False, priority=0, timeout_us=0):
+               use_cuda_shared_memory=False, cuda_device_id=0,
+               priority=0, timeout_us=0):
     tester.assertTrue(use_http or use_grpc or use_streaming)
     configs = []
     if use_http:
-        configs.append(("localhost:8000", ProtocolType.HTTP, False))
+        configs.append(_Config("localhost:8000", ProtocolType.HTTP, False))
     if use_grpc:
-        configs.append(("localhost:8001", ProtocolType.GRPC, False))
+        configs.append(_Config("localhost:8001", ProtocolType.GRPC, False))
     if use_streaming:
-        configs.append(("localhost:8001", ProtocolType.GRPC, True))
+        configs.append(_Config("localhost:8001", ProtocolType.GRPC, True))
     tester.assertEqual(len(input_shape_values), len(dummy_input_shapes))
     io_cnt = len(input_shape_values)
 
@@ -417,7 +667,14 @@ def infer_shape_tensor(tester, pf, batch_size, tensor_dtype, input_shape_values,
     expected_dict = {}
     shm_ip_handles = list()
     shm_op_handles = list()
-    shared_memory_ctx = SharedMemoryControlContext("localhost:8000",  ProtocolType.HTTP, verbose=False)
+    # use the same protocol/endpoint for shared memory control as the
+    # inference configs so gRPC-only runs do not also need a second
+    # HTTP connection to port 8000
+    if use_grpc or use_streaming:
+        shared_memory_ctx = su.get_shm_control_ctx("localhost:8001", ProtocolType.GRPC)
+    else:
+        shared_memory_ctx = su.get_shm_control_ctx("localhost:8000", ProtocolType.HTTP)
+    tensor_dtype_itemsize = np.dtype(tensor_dtype).itemsize
 
     for io_num in range(io_cnt):
         tester.assertTrue(pf == "plan" or pf == "plan_nobatch")
@@ -428,62 +685,62 @@ def infer_shape_tensor(tester, pf, batch_size, tensor_dtype, input_shape_values,
         dummy_output_name = "DUMMY_OUTPUT{}".format(io_num)
 
         input_list = list()
-        dummy_input_list = list()
+        # preallocate the per-slot list; appending would grow and
+        # reallocate it batch_size times
+        dummy_input_list = [None] * batch_size
         expected_list = list()
+        # Prepare the dummy tensor, drawing the whole batch in one call
+        rtensor_dtype = _range_repr_dtype(tensor_dtype)
+        if (rtensor_dtype != np.bool):
+            rtensor_min, rtensor_max = _dtype_bounds(rtensor_dtype)
+            dummy_in0_all = _rng().integers(low=rtensor_min, high=rtensor_max,
+                                    size=(batch_size,) + tuple(dummy_input_shapes[io_num]),
+                                    dtype=rtensor_dtype)
+        else:
+            dummy_in0_all = _rng().choice(a=[False, True],
+                                    size=(batch_size,) + tuple(dummy_input_shapes[io_num]))
         for b in range(batch_size):
-            # Prepare the dummy tensor
-            rtensor_dtype = _range_repr_dtype(tensor_dtype)
-            if (rtensor_dtype != np.bool):
-                dummy_in0 = np.random.randint(low=np.iinfo(rtensor_dtype).min,
-                                        high=np.iinfo(rtensor_dtype).max,
-                                        size=dummy_input_shapes[io_num], dtype=rtensor_dtype)
-            else:
-                dummy_in0 = np.random.choice(a=[False, True], size=dummy_input_shapes[io_num])
+            dummy_in0 = dummy_in0_all[b]
             if tensor_dtype != np.object:
                 dummy_in0 = dummy_in0.astype(tensor_dtype)
             else:
-                dummy_in0 = np.array([str(x) for x in in0.flatten()],
-                                dtype=object).reshape(in0.shape)
+                dummy_in0 = np.char.mod('%d', dummy_in0).astype(object)
 
-            dummy_input_list.append(dummy_in0)
+            dummy_input_list[b] = dummy_in0
 
         # Prepare shape input tensor. Only one tensor per batch
         in0 = np.asarray(input_shape_values[io_num], dtype=np.int32)
         input_list.append(in0)
 
-        # Prepare the expected list for the output
-        expected0 = np.ndarray.copy(in0)
+        # Prepare the expected list for the output. The shape input is
+        # never mutated so it can be used as the expected value directly.
+        expected0 = in0
         expected_list.append(expected0)
 
         expected_dict[output_name] = expected_list
 
-        input_byte_size = len(in0) * np.dtype(tensor_dtype).itemsize
+        input_byte_size = len(in0) * tensor_dtype_itemsize
         output_byte_size = input_byte_size * batch_size
         dummy_input_byte_size = tu.shape_element_count(dummy_input_shapes[io_num]) *\
-                            np.dtype(tensor_dtype).itemsize * batch_size
+                            tensor_dtype_itemsize * batch_size
         # The dimension of this tensor will be the value of the shape tensor
         dummy_output_byte_size = tu.shape_element_count(in0) *\
-                            np.dtype(tensor_dtype).itemsize * batch_size
+                            tensor_dtype_itemsize * batch_size
         
         # create and register shared memory region for inputs and outputs
         if use_cuda_shared_memory:
-            shm_ip_handles.append(cudashm.create_shared_memory_region("input"+str(io_num)+"_data"+shm_suffix,
-                                                                input_byte_size, 0))
-            shm_ip_handles.append(cudashm.create_shared_memory_region("dummy_input"+str(io_num)+"_data"+shm_suffix,
-                                                                dummy_input_byte_size, 0))
-            shm_op_handles.append(cudashm.create_shared_memory_region("output"+str(io_num)+"_data"+shm_suffix,
-                                                                output_byte_size, 0))
-            shm_op_handles.append(cudashm.create_shared_memory_region("dummy_output"+str(io_num)+"_data"+shm_suffix,
-                                                                dummy_output_byte_size, 0))
-            
-            shared_memory_ctx.cuda_register(shm_ip_handles[2 * io_num])
-            shared_memory_ctx.cuda_register(shm_ip_handles[2 * io_num + 1])
-            shared_memory_ctx.cuda_register(shm_op_handles[2 * io_num])
-            shared_memory_ctx.cuda_register(shm_op_handles[2 * io_num + 1])
+            shm_ip_handles.append(_get_cudashm().create_shared_memory_region("input"+str(io_num)+"_data"+shm_suffix,
+                                                                input_byte_size, cuda_device_id))
+            shm_ip_handles.append(_get_cudashm().create_shared_memory_region("dummy_input"+str(io_num)+"_data"+shm_suffix,
+                                                                dummy_input_byte_size, cuda_device_id))
+            shm_op_handles.append(_get_cudashm().create_shared_memory_region("output"+str(io_num)+"_data"+shm_suffix,
+                                                                output_byte_size, cuda_device_id))
+            shm_op_handles.append(_get_cudashm().create_shared_memory_region("dummy_output"+str(io_num)+"_data"+shm_suffix,
+                                                                dummy_output_byte_size, cuda_device_id))
 
             # copy data into shared memory region for input values
-            cudashm.set_shared_memory_region(shm_ip_handles[2 * io_num], input_list)
-            cudashm.set_shared_memory_region(shm_ip_handles[2 * io_num + 1], dummy_input_list)
+            _get_cudashm().set_shared_memory_region(shm_ip_handles[2 * io_num], input_list)
+            _get_cudashm().set_shared_memory_region(shm_ip_handles[2 * io_num + 1], dummy_input_list)
         elif use_system_shared_memory:
             shm_ip_handles.append(shm.create_shared_memory_region("input"+str(io_num)+"_data"+shm_suffix,\
                                         "/input"+str(io_num)+shm_suffix, input_byte_size))
@@ -492,11 +749,7 @@ def infer_shape_tensor(tester, pf, batch_size, tensor_dtype, input_shape_values,
             shm_op_handles.append(shm.create_shared_memory_region("output"+str(io_num)+"_data"+shm_suffix,\
                                         "/output"+str(io_num)+shm_suffix, output_byte_size))
             shm_op_handles.append(shm.create_shared_memory_region("dummy_output"+str(io_num)+"_data"+shm_suffix,\
-                                        "/dummy_output"+str(io_num)+shm_suffix, dummy_output_byte_size)) 
-            shared_memory_ctx.register(shm_ip_handles[2 * io_num])
-            shared_memory_ctx.register(shm_ip_handles[2 * io_num + 1])
-            shared_memory_ctx.register(shm_op_handles[2 * io_num])
-            shared_memory_ctx.register(shm_op_handles[2 * io_num + 1])
+                                        "/dummy_output"+str(io_num)+shm_suffix, dummy_output_byte_size))
             # copy data into shared memory region for input values
             shm.set_shared_memory_region(shm_ip_handles[2 * io_num], input_list)
             shm.set_shared_memory_region(shm_ip_handles[2 * io_num + 1], dummy_input_list)
@@ -511,13 +764,32 @@ def infer_shape_tensor(tester, pf, batch_size, tensor_dtype, input_shape_values,
             output_dict[output_name] = InferContext.ResultFormat.RAW
             output_dict[dummy_output_name] = InferContext.ResultFormat.RAW
 
+    # Overlapping the per-region round-trips is only safe on the gRPC
+    # control context; the HTTP context keeps per-request state written
+    # by libcurl callbacks, so its calls must stay serial.
+    def _each_region(func, handles):
+        if use_grpc or use_streaming:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(func, handles))
+        else:
+            for handle in handles:
+                func(handle)
+
+    # register all regions at once so the per-region round-trips to the
+    # server overlap where the protocol allows it
+    if use_cuda_shared_memory:
+        _each_region(shared_memory_ctx.cuda_register,
+                     shm_ip_handles + shm_op_handles)
+    elif use_system_shared_memory:
+        _each_region(shared_memory_ctx.register,
+                     shm_ip_handles + shm_op_handles)
+
+    model_name = tu.get_zero_model_name(pf, io_cnt, tensor_dtype)
+
     # Run inference and check results for each config
     for config in configs:
-        model_name = tu.get_zero_model_name(pf, io_cnt, tensor_dtype)
-
-        ctx = InferContext(config[0], config[1], model_name, model_version,
-                           correlation_id=0, streaming=config[2],
-                           verbose=True)
+        ctx = _get_infer_ctx(config.url, config.protocol, model_name,
+                             model_version, 0, config.streaming)
         results = ctx.run(input_dict, output_dict, batch_size,
                           priority=priority, timeout_us=timeout_us)
 
@@ -526,7 +798,7 @@ def infer_shape_tensor(tester, pf, batch_size, tensor_dtype, input_shape_values,
             tester.assertEqual(ctx.get_last_request_model_version(), model_version)
 
         tester.assertEqual(len(results), 2*io_cnt)
-        for (result_name, result_val) in iteritems(results):
+        for (result_name, result_val) in results.items():
             tester.assertTrue(result_name in output_dict)
             expected = expected_dict[output_name][0]
             for b in range(batch_size):
@@ -543,15 +815,13 @@ def infer_shape_tensor(tester, pf, batch_size, tensor_dtype, input_shape_values,
                                   model_name, result_name, b, expected, result_val[b]))
 
     if use_cuda_shared_memory or use_system_shared_memory:
-        for io_num in range(2 * io_cnt):
-            shared_memory_ctx.unregister(shm_ip_handles[io_num])
-            shared_memory_ctx.unregister(shm_op_handles[io_num])
+        _each_region(shared_memory_ctx.unregister,
+                     shm_ip_handles + shm_op_handles)
+        for handle in shm_ip_handles + shm_op_handles:
             if use_cuda_shared_memory:
-                cudashm.destroy_shared_memory_region(shm_ip_handles[io_num])
-                cudashm.destroy_shared_memory_region(shm_op_handles[io_num])
+                _get_cudashm().destroy_shared_memory_region(handle)
             else:
-                shm.destroy_shared_memory_region(shm_ip_handles[io_num])
-                shm.destroy_shared_memory_region(shm_op_handles[io_num])
+                shm.destroy_shared_memory_region(handle)
 
     return results
 
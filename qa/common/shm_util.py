@@ -26,12 +26,53 @@
 
 import sys
 import os
+import atexit
+import threading
 import numpy as np
 from tensorrtserver.api import *
 import tensorrtserver.shared_memory as shm
-import tensorrtserver.cuda_shared_memory as cudashm
 from ctypes import *
 
+# Importing tensorrtserver.cuda_shared_memory loads the CUDA shared
+# memory client library, which drags in the CUDA runtime even for
+# CPU-only test shards. Defer the import to the first CUDA shared
+# memory use.
+_cudashm = None
+
+def _get_cudashm():
+    global _cudashm
+    if _cudashm is None:
+        import tensorrtserver.cuda_shared_memory as cudashm
+        _cudashm = cudashm
+    return _cudashm
+
+# A SharedMemoryControlContext opens a TCP or gRPC connection, which is
+# expensive relative to the register/unregister calls made over it, so
+# cache contexts and reuse them across calls. The HTTP implementation
+# keeps per-request state on the context, written from libcurl
+# callbacks, so a context must never be shared between threads; the
+# cache is keyed by thread as well, while the dict itself is shared
+# (under a lock) so every context can be closed at process exit.
+_shm_ctx_cache = {}
+_shm_ctx_cache_lock = threading.Lock()
+
+def get_shm_control_ctx(url="localhost:8000", protocol=ProtocolType.HTTP):
+    key = (threading.get_ident(), url, protocol)
+    with _shm_ctx_cache_lock:
+        ctx = _shm_ctx_cache.get(key, None)
+        if ctx is None:
+            ctx = SharedMemoryControlContext(url, protocol, verbose=False)
+            _shm_ctx_cache[key] = ctx
+    return ctx
+
+def _close_cached_shm_ctxs():
+    with _shm_ctx_cache_lock:
+        for ctx in _shm_ctx_cache.values():
+            ctx.close()
+        _shm_ctx_cache.clear()
+
+atexit.register(_close_cached_shm_ctxs)
+
 def _range_repr_dtype(dtype):
     if dtype == np.float64:
         return np.int32
@@ -49,159 +90,154 @@ def _prepend_string_size(input_values):
         input_list.append(serialize_string_tensor(input_value))
     return input_list
 
+# infer_exact recreates its input/output regions with the same names
+# and sizes on every call, so registration and IPC handle traffic is
+# paid per request. Keep the regions (and their server-side
+# registrations) in a module-level pool keyed by name, size and kind
+# and only refresh the contents on reuse; the pooled regions are
+# destroyed when the test process exits. The lock keeps concurrent
+# test threads from evicting and destroying a region another thread
+# just took out of the pool.
+_shm_region_pool = {}
+_shm_region_pool_lock = threading.Lock()
+
+def _get_or_create_pooled_region(region_name, byte_size, shared_memory_ctx,
+                                 use_cuda_shared_memory, cuda_device_id=0):
+    key = (region_name, byte_size, use_cuda_shared_memory, cuda_device_id)
+    with _shm_region_pool_lock:
+        handle = _shm_region_pool.get(key, None)
+        if handle is not None:
+            return handle
+        # a same-named region of a different size can't be reused so
+        # destroy it before creating the replacement
+        for old_key in list(_shm_region_pool.keys()):
+            if old_key[0] == region_name:
+                old_handle = _shm_region_pool.pop(old_key)
+                shared_memory_ctx.unregister(old_handle)
+                destroy_either_shm_region(old_handle, not old_key[2], old_key[2])
+        if use_cuda_shared_memory:
+            handle = _get_cudashm().create_shared_memory_region(region_name+'_data',
+                                                         byte_size, cuda_device_id)
+            shared_memory_ctx.unregister(handle)
+            shared_memory_ctx.cuda_register(handle)
+        else:
+            handle = shm.create_shared_memory_region(region_name+'_data',
+                                                     '/'+region_name, byte_size)
+            shared_memory_ctx.unregister(handle)
+            shared_memory_ctx.register(handle)
+        _shm_region_pool[key] = handle
+        return handle
+
+def _destroy_shm_region_pool():
+    shared_memory_ctx = get_shm_control_ctx("localhost:8000", ProtocolType.HTTP)
+    with _shm_region_pool_lock:
+        for key, handle in _shm_region_pool.items():
+            shared_memory_ctx.unregister(handle)
+            destroy_either_shm_region(handle, not key[2], key[2])
+        _shm_region_pool.clear()
+
+atexit.register(_destroy_shm_region_pool)
+
 def create_register_set_shm_regions(input0_list, input1_list, expected0_list,
                                     expected1_list, outputs, shm_region_names,
                                     precreated_shm_regions, use_system_shared_memory,
-                                    use_cuda_shared_memory):
+                                    use_cuda_shared_memory, cuda_device_id=0):
     if use_system_shared_memory and use_cuda_shared_memory:
         raise ValueError("Cannot set both System and CUDA shared memory flags to 1")
 
     if not (use_system_shared_memory or use_cuda_shared_memory):
         return []
 
-    shared_memory_ctx = SharedMemoryControlContext("localhost:8000",  ProtocolType.HTTP, verbose=False)
+    shared_memory_ctx = get_shm_control_ctx("localhost:8000", ProtocolType.HTTP)
 
     input0_byte_size = sum([i0.nbytes for i0 in input0_list])
     input1_byte_size = sum([i1.nbytes for i1 in input1_list])
     output0_byte_size = sum([e0.nbytes for e0 in expected0_list])
     output1_byte_size = sum([e1.nbytes for e1 in expected1_list])
-    shm_io_handles = []
 
     if shm_region_names is None:
         shm_region_names = ['input0', 'input1', 'output0', 'output1']
 
-    if use_system_shared_memory:
-        shm_ip0_handle = shm.create_shared_memory_region(shm_region_names[0]+'_data',
-                                                    '/'+shm_region_names[0], input0_byte_size)
-        shm_ip1_handle = shm.create_shared_memory_region(shm_region_names[1]+'_data',
-                                                    '/'+shm_region_names[1], input1_byte_size)
+    shm_ip0_handle = _get_or_create_pooled_region(shm_region_names[0], input0_byte_size,
+                                    shared_memory_ctx, use_cuda_shared_memory, cuda_device_id)
+    shm_ip1_handle = _get_or_create_pooled_region(shm_region_names[1], input1_byte_size,
+                                    shared_memory_ctx, use_cuda_shared_memory, cuda_device_id)
+    if use_cuda_shared_memory:
+        _get_cudashm().set_shared_memory_region(shm_ip0_handle, input0_list)
+        _get_cudashm().set_shared_memory_region(shm_ip1_handle, input1_list)
+    else:
         shm.set_shared_memory_region(shm_ip0_handle, input0_list)
         shm.set_shared_memory_region(shm_ip1_handle, input1_list)
-        shared_memory_ctx.unregister(shm_ip0_handle)
-        shared_memory_ctx.register(shm_ip0_handle)
-        shared_memory_ctx.unregister(shm_ip1_handle)
-        shared_memory_ctx.register(shm_ip1_handle)
-        shm_io_handles.extend([shm_ip0_handle, shm_ip1_handle])
-
-        i = 0
-        if "OUTPUT0" in outputs:
-            if precreated_shm_regions is None:
-                shm_op0_handle = shm.create_shared_memory_region(shm_region_names[2]+'_data',
-                                                            '/'+shm_region_names[2], output0_byte_size)
-                shared_memory_ctx.unregister(shm_op0_handle)
-                shared_memory_ctx.register(shm_op0_handle)
-            else:
-                shm_op0_handle = precreated_shm_regions[0]
-            shm_io_handles.append(shm_op0_handle)
-            i +=1
-        if "OUTPUT1" in outputs:
-            if precreated_shm_regions is None:
-                shm_op1_handle = shm.create_shared_memory_region(shm_region_names[2+i]+'_data',
-                                                            '/'+shm_region_names[2+i], output1_byte_size)
-                shared_memory_ctx.unregister(shm_op1_handle)
-                shared_memory_ctx.register(shm_op1_handle)
-            else:
-                shm_op1_handle = precreated_shm_regions[i]
-            shm_io_handles.append(shm_op1_handle)
-
-    if use_cuda_shared_memory:
-        shm_ip0_handle = cudashm.create_shared_memory_region(shm_region_names[0]+'_data',
-                                                    input0_byte_size, 0)
-        shm_ip1_handle = cudashm.create_shared_memory_region(shm_region_names[1]+'_data',
-                                                    input1_byte_size, 0)
-        cudashm.set_shared_memory_region(shm_ip0_handle, input0_list)
-        cudashm.set_shared_memory_region(shm_ip1_handle, input1_list)
-        shared_memory_ctx.unregister(shm_ip0_handle)
-        shared_memory_ctx.cuda_register(shm_ip0_handle)
-        shared_memory_ctx.unregister(shm_ip1_handle)
-        shared_memory_ctx.cuda_register(shm_ip1_handle)
-        shm_io_handles.extend([shm_ip0_handle, shm_ip1_handle])
-
-        i = 0
-        if "OUTPUT0" in outputs:
-            if precreated_shm_regions is None:
-                shm_op0_handle = cudashm.create_shared_memory_region(shm_region_names[2]+'_data',
-                                                            output0_byte_size, 0)
-                shared_memory_ctx.unregister(shm_op0_handle)
-                shared_memory_ctx.cuda_register(shm_op0_handle)
-            else:
-                shm_op0_handle = precreated_shm_regions[0]
-            shm_io_handles.append(shm_op0_handle)
-            i+=1
-        if "OUTPUT1" in outputs:
-            if precreated_shm_regions is None:
-                shm_op1_handle = cudashm.create_shared_memory_region(shm_region_names[2+i]+'_data',
-                                                            output1_byte_size, 0)
-                shared_memory_ctx.unregister(shm_op1_handle)
-                shared_memory_ctx.cuda_register(shm_op1_handle)
-            else:
-                shm_op1_handle = precreated_shm_regions[i]
-            shm_io_handles.append(shm_op1_handle)
+    shm_io_handles = [shm_ip0_handle, shm_ip1_handle]
+
+    i = 0
+    if "OUTPUT0" in outputs:
+        if precreated_shm_regions is None:
+            shm_op0_handle = _get_or_create_pooled_region(shm_region_names[2], output0_byte_size,
+                                    shared_memory_ctx, use_cuda_shared_memory, cuda_device_id)
+        else:
+            shm_op0_handle = precreated_shm_regions[0]
+        shm_io_handles.append(shm_op0_handle)
+        i +=1
+    if "OUTPUT1" in outputs:
+        if precreated_shm_regions is None:
+            shm_op1_handle = _get_or_create_pooled_region(shm_region_names[2+i], output1_byte_size,
+                                    shared_memory_ctx, use_cuda_shared_memory, cuda_device_id)
+        else:
+            shm_op1_handle = precreated_shm_regions[i]
+        shm_io_handles.append(shm_op1_handle)
 
     return shm_io_handles
 
 def unregister_cleanup_shm_regions(shm_handles, precreated_shm_regions, outputs, use_system_shared_memory, use_cuda_shared_memory):
-    if not (use_system_shared_memory or use_cuda_shared_memory):
-        return None
-
-    shared_memory_ctx = SharedMemoryControlContext("localhost:8000",  ProtocolType.HTTP, verbose=False)
-    shared_memory_ctx.unregister(shm_handles[0])
-    shared_memory_ctx.unregister(shm_handles[1])
-    if use_cuda_shared_memory:
-        cudashm.destroy_shared_memory_region(shm_handles[0])
-        cudashm.destroy_shared_memory_region(shm_handles[1])
-    else:
-        shm.destroy_shared_memory_region(shm_handles[0])
-        shm.destroy_shared_memory_region(shm_handles[1])
-
-    if precreated_shm_regions is None:
-        i = 0
-        if "OUTPUT0" in outputs:
-            shared_memory_ctx.unregister(shm_handles[2])
-            if use_cuda_shared_memory:
-                cudashm.destroy_shared_memory_region(shm_handles[2])
-            else:
-                shm.destroy_shared_memory_region(shm_handles[2])
-            i +=1
-        if "OUTPUT1" in outputs:
-            shared_memory_ctx.unregister(shm_handles[2+i])
-            if use_cuda_shared_memory:
-                cudashm.destroy_shared_memory_region(shm_handles[2+i])
-            else:
-                shm.destroy_shared_memory_region(shm_handles[2+i])
+    # Regions created by create_register_set_shm_regions come from the
+    # module-level pool: they stay registered so the next call with the
+    # same names and sizes can reuse them, and are destroyed at process
+    # exit. Precreated regions are owned by the caller, so there is
+    # nothing to tear down per call.
+    return None
 
 def create_register_set_either_shm_region(shm_region_names, input_list, input_byte_size,
                                         output_byte_size, shared_memory_ctx,
-                                        use_system_shared_memory, use_cuda_shared_memory):
+                                        use_system_shared_memory, use_cuda_shared_memory,
+                                        cuda_device_id=0):
     if use_cuda_shared_memory and use_system_shared_memory:
         raise ValueError("Cannot set both System and CUDA shared memory flags to 1")
 
     if not (use_system_shared_memory or use_cuda_shared_memory):
         return []
 
-    if use_system_shared_memory:
-        shm_ip_handle = cudashm.create_shared_memory_region(shm_region_names[0]+"_data",
-                                                            input_byte_size, 0)
-        shm_op_handle = cudashm.create_shared_memory_region(shm_region_names[1]+"_data",
-                                                            output_byte_size, 0)
+    if use_cuda_shared_memory:
+        shm_ip_handle = _get_cudashm().create_shared_memory_region(shm_region_names[0]+"_data",
+                                                            input_byte_size, cuda_device_id)
+        shm_op_handle = _get_cudashm().create_shared_memory_region(shm_region_names[1]+"_data",
+                                                            output_byte_size, cuda_device_id)
+        # the server rejects a register for a name that is already in
+        # its manager, so clear any stale registration first
+        shared_memory_ctx.unregister(shm_ip_handle)
         shared_memory_ctx.cuda_register(shm_ip_handle)
+        shared_memory_ctx.unregister(shm_op_handle)
         shared_memory_ctx.cuda_register(shm_op_handle)
         # copy data into shared memory region for input values
-        cudashm.set_shared_memory_region(shm_ip_handle, input_list)
-    elif use_cuda_shared_memory:
+        _get_cudashm().set_shared_memory_region(shm_ip_handle, input_list)
+    else:
         shm_ip_handle = shm.create_shared_memory_region(shm_region_names[0]+"_data",\
                                     "/"+shm_region_names[0], input_byte_size)
         shm_op_handle = shm.create_shared_memory_region(shm_region_names[1]+"_data",\
                                     "/"+shm_region_names[1], output_byte_size)
+        # the server rejects a register for a name that is already in
+        # its manager, so clear any stale registration first
+        shared_memory_ctx.unregister(shm_ip_handle)
         shared_memory_ctx.register(shm_ip_handle)
+        shared_memory_ctx.unregister(shm_op_handle)
         shared_memory_ctx.register(shm_op_handle)
         # copy data into shared memory region for input values
         shm.set_shared_memory_region(shm_ip_handle, input_list)
-    
+
     return [shm_ip_handle, shm_op_handle]
 
 def destroy_either_shm_region(shm_handle, use_system_shared_memory, use_cuda_shared_memory):
     if use_cuda_shared_memory:
-        cudashm.destroy_shared_memory_region(shm_handle)
+        _get_cudashm().destroy_shared_memory_region(shm_handle)
     else:
         shm.destroy_shared_memory_region(shm_handle)